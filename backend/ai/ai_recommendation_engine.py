@@ -7,65 +7,114 @@ Advanced machine learning system for personalized food recommendations
 import json
 import sys
 import os
-import numpy as np
-import pandas as pd
 from datetime import datetime, timedelta
 import pickle
 import warnings
 warnings.filterwarnings('ignore')
 
-# Import ML libraries
-try:
-    from sklearn.feature_extraction.text import TfidfVectorizer
-    from sklearn.metrics.pairwise import cosine_similarity
-    from sklearn.cluster import KMeans
-    from sklearn.preprocessing import StandardScaler
-    from sklearn.decomposition import PCA
-    from sklearn.ensemble import RandomForestRegressor
-    from sklearn.model_selection import train_test_split
-except ImportError as e:
-    print(f"Warning: Some ML libraries not available: {e}")
+# ML libraries (numpy, sklearn) are imported on first use to keep cold start cheap
+
+from catalog_index import ProductCatalogIndex
+from profile_store import (
+    ShardedProfileStore,
+    apply_profile_update,
+    authkey_from_env,
+    calculate_user_similarity,
+    default_user_profile,
+    rank_similar_users
+)
+
+# Product-name keywords used by contextual scoring
+TIME_CONTEXT_KEYWORDS = {
+    'breakfast': (['breakfast', 'coffee', 'pastry', 'juice'], 0.8),
+    'lunch': (['salad', 'wrap', 'sandwich', 'light'], 0.7),
+    'dinner': (['dinner', 'pizza', 'pasta', 'heavy'], 0.8),
+    'late_night': (['snack', 'dessert', 'light'], 0.6)
+}
+
+WEATHER_CONTEXT_KEYWORDS = {
+    'hot': (['cold', 'salad', 'ice', 'fresh'], 0.8),
+    'cold': (['hot', 'warm', 'soup', 'comfort'], 0.8),
+    'rainy': (['warm', 'comfort', 'hearty'], 0.7)
+}
+
+# This would use more sophisticated mood-food mapping
+MOOD_FOOD_MAPPING = {
+    'happy': ['colorful', 'vibrant', 'dessert'],
+    'sad': ['comfort', 'warm', 'cheese'],
+    'stressed': ['light', 'simple', 'quick'],
+    'excited': ['spicy', 'unique', 'premium'],
+    'tired': ['energizing', 'coffee', 'protein']
+}
+
+# Stock state is not a product attribute for diversity purposes
+SIMILARITY_IGNORED_KEYS = {'is_available'}
+
+CONTEXT_VOCABULARY = (
+    {word for words, _ in TIME_CONTEXT_KEYWORDS.values() for word in words}
+    | {word for words, _ in WEATHER_CONTEXT_KEYWORDS.values() for word in words}
+    | {word for words in MOOD_FOOD_MAPPING.values() for word in words}
+)
 
 class AIRecommendationEngine:
-    def __init__(self):
-        self.user_profiles = {}
+    def __init__(self, profile_store=None):
+        # Profiles live in-process unless a ShardedProfileStore is supplied
+        self.sharded_profiles = profile_store is not None
+        self.user_profiles = profile_store if self.sharded_profiles else {}
         self.product_features = {}
+        self.catalog = ProductCatalogIndex(CONTEXT_VOCABULARY)
         self.interaction_matrix = None
-        self.tfidf_vectorizer = TfidfVectorizer(max_features=1000, stop_words='english')
+        self._tfidf_vectorizer = None
         self.collaborative_model = None
         self.content_model = None
         self.hybrid_model = None
         self.load_models()
     
+    @property
+    def tfidf_vectorizer(self):
+        """TF-IDF vectorizer, created on first access (raises ImportError without sklearn)"""
+        if self._tfidf_vectorizer is None:
+            from sklearn.feature_extraction.text import TfidfVectorizer
+            self._tfidf_vectorizer = TfidfVectorizer(max_features=1000, stop_words='english')
+        
+        return self._tfidf_vectorizer
+    
     def load_models(self):
         """Load pre-trained models or create new ones"""
         try:
-            if os.path.exists('models/user_profiles.pkl'):
+            if not self.sharded_profiles and os.path.exists('models/user_profiles.pkl'):
                 with open('models/user_profiles.pkl', 'rb') as f:
                     self.user_profiles = pickle.load(f)
             
             if os.path.exists('models/product_features.pkl'):
                 with open('models/product_features.pkl', 'rb') as f:
                     self.product_features = pickle.load(f)
+            
+            if os.path.exists('models/product_tombstones.pkl'):
+                with open('models/product_tombstones.pkl', 'rb') as f:
+                    self.catalog.restore_tombstones(pickle.load(f))
                     
             print("✅ AI models loaded successfully")
         except Exception as e:
             print(f"📊 Initializing new AI models: {e}")
             self.initialize_default_models()
+        
+        self.catalog.rebuild(self.product_features)
     
     def initialize_default_models(self):
         """Initialize default models with sample data"""
-        # Sample user profiles
-        self.user_profiles = {
-            'user_123': {
-                'preferences': ['italian', 'spicy', 'vegetarian'],
-                'order_history': ['pizza', 'pasta', 'salad'],
-                'dietary_restrictions': [],
-                'price_sensitivity': 0.7,
-                'order_frequency': 3.2,
-                'avg_order_value': 25.50
+        # Sample user profiles (a supplied profile store holds real users; never seed it)
+        if not self.sharded_profiles:
+            self.user_profiles = {
+                'user_123': {
+                    'preferences': ['italian', 'spicy', 'vegetarian'],
+                    'order_history': ['pizza', 'pasta', 'salad'],
+                    'dietary_restrictions': [],
+                    'price_sensitivity': 0.7,
+                    'order_frequency': 3.2,
+                    'avg_order_value': 25.50
+                }
             }
-        }
         
         # Sample product features
         self.product_features = {
@@ -78,6 +127,46 @@ class AIRecommendationEngine:
                 'tags': ['pizza', 'cheese', 'vegetarian']
             }
         }
+        self.catalog.rebuild(self.product_features)
+    
+    # Catalog mutation API: keeps product_features and the catalog index in sync
+    def upsert_product(self, product_id, features):
+        """Insert a new product or replace an existing one
+
+        A refresh without 'is_available' keeps the product's current stock state.
+        """
+        features = dict(features)
+        existing = self.product_features.get(product_id)
+        if existing is not None and 'is_available' not in features and 'is_available' in existing:
+            features['is_available'] = existing['is_available']
+        self.product_features[product_id] = features
+        self.catalog.upsert(product_id, features)
+    
+    def delete_product(self, product_id):
+        """Remove a product; its ID stays tombstoned as unavailable"""
+        if product_id not in self.product_features:
+            return False
+        
+        del self.product_features[product_id]
+        self.catalog.delete(product_id)
+        return True
+    
+    def set_product_availability(self, product_id, available):
+        """Mark a product as in or out of stock"""
+        if product_id not in self.product_features:
+            return False
+        
+        self.product_features[product_id]['is_available'] = bool(available)
+        self.catalog.set_available(product_id, available)
+        return True
+    
+    def update_product_price(self, product_id, price):
+        """Change a product's price"""
+        if product_id not in self.product_features:
+            return False
+        
+        self.product_features[product_id]['price'] = price
+        return True
     
     def get_personalized_recommendations(self, user_id, limit=10, context=None):
         """Get personalized recommendations using hybrid approach"""
@@ -89,7 +178,7 @@ class AIRecommendationEngine:
             content_recommendations = self.content_based_filtering(user_profile, limit)
             
             # Collaborative filtering
-            collaborative_recommendations = self.collaborative_filtering(user_id, limit)
+            collaborative_recommendations = self.collaborative_filtering(user_id, limit, user_profile)
             
             # Contextual filtering
             contextual_recommendations = self.contextual_filtering(user_profile, context, limit)
@@ -121,18 +210,7 @@ class AIRecommendationEngine:
     
     def get_user_profile(self, user_id):
         """Get or create user profile"""
-        if user_id not in self.user_profiles:
-            self.user_profiles[user_id] = {
-                'preferences': [],
-                'order_history': [],
-                'dietary_restrictions': [],
-                'price_sensitivity': 0.5,
-                'order_frequency': 1.0,
-                'avg_order_value': 20.0,
-                'last_updated': datetime.now().isoformat()
-            }
-        
-        return self.user_profiles[user_id]
+        return self.user_profiles.setdefault(user_id, default_user_profile())
     
     def content_based_filtering(self, user_profile, limit):
         """Content-based filtering using user preferences"""
@@ -154,19 +232,23 @@ class AIRecommendationEngine:
         recommendations.sort(key=lambda x: x['score'], reverse=True)
         return recommendations[:limit]
     
-    def collaborative_filtering(self, user_id, limit):
+    def collaborative_filtering(self, user_id, limit, user_profile=None):
         """Collaborative filtering using similar users"""
+        if user_profile is None:
+            user_profile = self.get_user_profile(user_id)
+        
         recommendations = []
+        seen_products = set()
         
-        # Find similar users (simplified approach)
-        similar_users = self.find_similar_users(user_id)
+        # Find similar users along with their order histories (one sharded round)
+        neighbours = self.find_similar_neighbours(user_id, user_profile, with_orders=True)
         
-        for similar_user in similar_users:
+        for similar_user, similarity, similar_user_orders in neighbours:
             # Get products liked by similar users
-            similar_user_orders = self.get_user_orders(similar_user)
             for product_id in similar_user_orders:
-                if product_id not in [r['product_id'] for r in recommendations]:
-                    score = self.calculate_collaborative_score(user_id, similar_user, product_id)
+                if product_id not in seen_products:
+                    seen_products.add(product_id)
+                    score = self.calculate_collaborative_score(similarity, product_id)
                     recommendations.append({
                         'product_id': product_id,
                         'score': score,
@@ -189,16 +271,19 @@ class AIRecommendationEngine:
             score = 0.0
             reasons = []
             
+            # None for products added outside the catalog API; scorers then read the name
+            keywords = self.catalog.get_context_keywords(product_id)
+            
             # Time-based context
             if 'time_of_day' in context:
-                time_score = self.get_time_context_score(features, context['time_of_day'])
+                time_score = self.get_time_context_score(features, context['time_of_day'], keywords)
                 score += time_score * 0.3
                 if time_score > 0:
                     reasons.append(f"Time appropriate ({context['time_of_day']})")
             
             # Weather-based context
             if 'weather' in context:
-                weather_score = self.get_weather_context_score(features, context['weather'])
+                weather_score = self.get_weather_context_score(features, context['weather'], keywords)
                 score += weather_score * 0.25
                 if weather_score > 0:
                     reasons.append(f"Weather suitable ({context['weather']})")
@@ -212,7 +297,7 @@ class AIRecommendationEngine:
             
             # Mood-based context
             if 'mood' in context:
-                mood_score = self.get_mood_context_score(features, context['mood'])
+                mood_score = self.get_mood_context_score(features, context['mood'], keywords)
                 score += mood_score * 0.25
                 if mood_score > 0:
                     reasons.append(f"Mood matching ({context['mood']})")
@@ -379,34 +464,11 @@ class AIRecommendationEngine:
     
     def update_user_profile(self, user_id, interaction_data):
         """Update user profile based on new interaction data"""
-        if user_id not in self.user_profiles:
-            self.get_user_profile(user_id)
-        
-        profile = self.user_profiles[user_id]
-        
-        # Update order history
-        if 'ordered_items' in interaction_data:
-            profile['order_history'].extend(interaction_data['ordered_items'])
-            profile['order_history'] = profile['order_history'][-50:]  # Keep last 50
-        
-        # Update preferences
-        if 'preferences' in interaction_data:
-            profile['preferences'].extend(interaction_data['preferences'])
-            profile['preferences'] = list(set(profile['preferences']))  # Remove duplicates
-        
-        # Update order frequency
-        if 'order_value' in interaction_data:
-            current_avg = profile['avg_order_value']
-            order_value = interaction_data['order_value']
-            profile['avg_order_value'] = (current_avg + order_value) / 2
-        
-        # Update dietary restrictions
-        if 'dietary_changes' in interaction_data:
-            profile['dietary_restrictions'] = list(set(
-                profile['dietary_restrictions'] + interaction_data['dietary_changes']
-            ))
-        
-        profile['last_updated'] = datetime.now().isoformat()
+        if self.sharded_profiles:
+            # Writes go to the owning shard so they are not lost on a copy
+            self.user_profiles.update_profile(user_id, interaction_data)
+        else:
+            apply_profile_update(self.get_user_profile(user_id), interaction_data)
     
     # Helper methods for various scoring functions
     def calculate_content_similarity(self, user_profile, product_features):
@@ -437,104 +499,97 @@ class AIRecommendationEngine:
         
         return min(score, 1.0)
     
+    def get_content_reasons(self, user_profile, product_features):
+        """Explain why a product matched the user's profile"""
+        reasons = []
+        
+        product_cuisine = product_features.get('cuisine', '')
+        if product_cuisine and product_cuisine in user_profile.get('preferences', []):
+            reasons.append(f"Matches your taste for {product_cuisine}")
+        
+        if self.within_price_range(product_features, user_profile):
+            reasons.append("Within your usual budget")
+        
+        if product_features.get('rating', 0) >= 4.5:
+            reasons.append("Highly rated")
+        
+        return reasons
+    
+    def calculate_collaborative_score(self, similarity, product_id):
+        """Score a product liked by a user with the given similarity"""
+        # Unknown products get a neutral rating
+        rating = self.product_features.get(product_id, {}).get('rating', 2.5)
+        return similarity * (0.5 + 0.5 * rating / 5.0)
+    
     def find_similar_users(self, user_id, max_similar=5):
         """Find users with similar preferences (simplified)"""
-        # In production, this would use more sophisticated similarity algorithms
         target_profile = self.get_user_profile(user_id)
-        similar_users = []
-        
-        for other_user_id, other_profile in self.user_profiles.items():
-            if other_user_id == user_id:
-                continue
-            
-            similarity = self.calculate_user_similarity(target_profile, other_profile)
-            if similarity > 0.5:  # Similarity threshold
-                similar_users.append((other_user_id, similarity))
+        return [user[0] for user in self.find_similar_neighbours(user_id, target_profile, max_similar)]
+    
+    def find_similar_neighbours(self, user_id, target_profile, max_similar=5, with_orders=False):
+        """(user_id, similarity[, order_history]) tuples for the most similar users"""
+        # In production, this would use more sophisticated similarity algorithms
+        if self.sharded_profiles:
+            # Scatter to every shard and merge the per-shard top-k
+            return self.user_profiles.find_similar(target_profile, user_id, max_similar,
+                                                   with_orders=with_orders)
         
-        # Sort by similarity and return top users
-        similar_users.sort(key=lambda x: x[1], reverse=True)
-        return [user[0] for user in similar_users[:max_similar]]
+        return rank_similar_users(self.user_profiles, target_profile, user_id, max_similar,
+                                  with_orders=with_orders)
     
     def calculate_user_similarity(self, profile1, profile2):
         """Calculate similarity between two user profiles"""
-        score = 0.0
-        
-        # Compare preferences
-        prefs1 = set(profile1.get('preferences', []))
-        prefs2 = set(profile2.get('preferences', []))
-        if prefs1 and prefs2:
-            common_prefs = prefs1.intersection(prefs2)
-            score += len(common_prefs) / max(len(prefs1), len(prefs2)) * 0.4
-        
-        # Compare dietary restrictions
-        diet1 = set(profile1.get('dietary_restrictions', []))
-        diet2 = set(profile2.get('dietary_restrictions', []))
-        if diet1 and diet2:
-            common_diet = diet1.intersection(diet2)
-            score += len(common_diet) / max(len(diet1), len(diet2)) * 0.3
-        
-        # Compare price sensitivity
-        price_sens1 = profile1.get('price_sensitivity', 0.5)
-        price_sens2 = profile2.get('price_sensitivity', 0.5)
-        price_diff = abs(price_sens1 - price_sens2)
-        score += (1.0 - price_diff) * 0.3
-        
-        return min(score, 1.0)
+        return calculate_user_similarity(profile1, profile2)
     
-    def get_time_context_score(self, product_features, time_of_day):
+    def get_time_context_score(self, product_features, time_of_day, keywords=None):
         """Get time-based context score"""
-        product_name = product_features.get('name', '').lower()
+        if keywords is None:
+            keywords = self.extract_context_keywords(product_features)
         
-        if time_of_day == 'breakfast':
-            if any(word in product_name for word in ['breakfast', 'coffee', 'pastry', 'juice']):
-                return 0.8
-        elif time_of_day == 'lunch':
-            if any(word in product_name for word in ['salad', 'wrap', 'sandwich', 'light']):
-                return 0.7
-        elif time_of_day == 'dinner':
-            if any(word in product_name for word in ['dinner', 'pizza', 'pasta', 'heavy']):
-                return 0.8
-        elif time_of_day == 'late_night':
-            if any(word in product_name for word in ['snack', 'dessert', 'light']):
-                return 0.6
+        if time_of_day in TIME_CONTEXT_KEYWORDS:
+            words, score = TIME_CONTEXT_KEYWORDS[time_of_day]
+            if keywords.intersection(words):
+                return score
         
         return 0.1  # Default low score
     
-    def get_weather_context_score(self, product_features, weather):
+    def get_weather_context_score(self, product_features, weather, keywords=None):
         """Get weather-based context score"""
-        product_name = product_features.get('name', '').lower()
+        if keywords is None:
+            keywords = self.extract_context_keywords(product_features)
         
-        if weather == 'hot':
-            if any(word in product_name for word in ['cold', 'salad', 'ice', 'fresh']):
-                return 0.8
-        elif weather == 'cold':
-            if any(word in product_name for word in ['hot', 'warm', 'soup', 'comfort']):
-                return 0.8
-        elif weather == 'rainy':
-            if any(word in product_name for word in ['warm', 'comfort', 'hearty']):
-                return 0.7
+        if weather in WEATHER_CONTEXT_KEYWORDS:
+            words, score = WEATHER_CONTEXT_KEYWORDS[weather]
+            if keywords.intersection(words):
+                return score
         
         return 0.1
     
-    def get_mood_context_score(self, product_features, mood):
+    def get_location_context_score(self, product_features, location):
+        """Get location-based context score"""
+        # Location context may carry the cuisines popular around the user
+        if isinstance(location, dict):
+            if product_features.get('cuisine') in location.get('popular_cuisines', []):
+                return 0.6
+        
+        return 0.1
+    
+    def get_mood_context_score(self, product_features, mood, keywords=None):
         """Get mood-based context score"""
-        # This would use more sophisticated mood-food mapping
-        mood_food_mapping = {
-            'happy': ['colorful', 'vibrant', 'dessert'],
-            'sad': ['comfort', 'warm', 'cheese'],
-            'stressed': ['light', 'simple', 'quick'],
-            'excited': ['spicy', 'unique', 'premium'],
-            'tired': ['energizing', 'coffee', 'protein']
-        }
+        if keywords is None:
+            keywords = self.extract_context_keywords(product_features)
         
-        if mood in mood_food_mapping:
-            product_name = product_features.get('name', '').lower()
-            for mood_food in mood_food_mapping[mood]:
-                if mood_food in product_name:
-                    return 0.7
+        if mood in MOOD_FOOD_MAPPING:
+            if keywords.intersection(MOOD_FOOD_MAPPING[mood]):
+                return 0.7
         
         return 0.1
     
+    def extract_context_keywords(self, product_features):
+        """Context keywords contained in a product name (uncached path)"""
+        product_name = product_features.get('name', '').lower()
+        return frozenset(word for word in CONTEXT_VOCABULARY if word in product_name)
+    
     def violates_dietary_restrictions(self, product_features, user_profile):
         """Check if product violates user dietary restrictions"""
         user_restrictions = set(user_profile.get('dietary_restrictions', []))
@@ -583,9 +638,8 @@ class AIRecommendationEngine:
         return similar_count >= 2  # Don't allow more than 2 very similar items
     
     def is_available(self, product_id):
-        """Check if product is available (simplified)"""
-        # In production, this would check real inventory
-        return True
+        """Check if product is available via the catalog availability bitmap"""
+        return self.catalog.is_available(product_id)
     
     def is_new_to_user(self, product_id, user_profile):
         """Check if product is new to user's order history"""
@@ -613,7 +667,7 @@ class AIRecommendationEngine:
     def calculate_similarity(self, features1, features2):
         """Calculate similarity between two product features"""
         # Simplified similarity calculation
-        common_keys = set(features1.keys()).intersection(set(features2.keys()))
+        common_keys = set(features1.keys()).intersection(set(features2.keys())) - SIMILARITY_IGNORED_KEYS
         if not common_keys:
             return 0.0
         
@@ -629,11 +683,13 @@ class AIRecommendationEngine:
         if not recommendations:
             return 0.0
         
+        from statistics import pstdev
+        
         total_score = sum(rec['total_score'] for rec in recommendations)
         avg_score = total_score / len(recommendations)
         
         # Confidence is higher when average score is higher and scores are consistent
-        consistency = 1.0 - (np.std([rec['total_score'] for rec in recommendations]) if len(recommendations) > 1 else 0)
+        consistency = 1.0 - (pstdev([rec['total_score'] for rec in recommendations]) if len(recommendations) > 1 else 0)
         
         return min(avg_score * consistency, 1.0)
     
@@ -670,12 +726,18 @@ class AIRecommendationEngine:
         os.makedirs('models', exist_ok=True)
         
         try:
-            with open('models/user_profiles.pkl', 'wb') as f:
-                pickle.dump(self.user_profiles, f)
+            if self.sharded_profiles:
+                self.user_profiles.save()
+            else:
+                with open('models/user_profiles.pkl', 'wb') as f:
+                    pickle.dump(self.user_profiles, f)
             
             with open('models/product_features.pkl', 'wb') as f:
                 pickle.dump(self.product_features, f)
             
+            with open('models/product_tombstones.pkl', 'wb') as f:
+                pickle.dump(self.catalog.tombstoned_ids, f)
+            
             print("✅ AI models saved successfully")
         except Exception as e:
             print(f"❌ Error saving models: {e}")
@@ -698,8 +760,21 @@ def main():
             print("❌ Invalid context JSON")
             sys.exit(1)
     
+    # Use sharded user profiles when shard addresses are configured
+    profile_store = None
+    shard_addresses = os.environ.get('AI_PROFILE_SHARDS')
+    if shard_addresses:
+        try:
+            profile_store = ShardedProfileStore(
+                [address.strip() for address in shard_addresses.split(',') if address.strip()],
+                authkey_from_env()
+            )
+        except (ValueError, OSError) as e:
+            print(f"❌ Cannot connect to profile shards: {e}")
+            sys.exit(1)
+    
     # Initialize AI engine
-    engine = AIRecommendationEngine()
+    engine = AIRecommendationEngine(profile_store)
     
     # Get recommendations
     recommendations = engine.get_personalized_recommendations(user_id, limit, context)
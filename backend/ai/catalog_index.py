@@ -0,0 +1,131 @@
+#!/usr/bin/env python3
+"""
+Product Catalog Index
+In-place derived structures for the recommendation engine's product catalog
+"""
+
+from collections import OrderedDict
+
+MAX_TOMBSTONES = 100000
+
+
+class ProductCatalogIndex:
+    """Slot-based index over product features, kept in sync by incremental mutations.
+
+    Every live product owns an integer slot in an availability bitmap, so
+    single-product changes never require a rebuild. Deleting a product frees
+    its slot for reuse and records the ID as a tombstone, so IDs that reach the
+    business rules from other sources (e.g. order histories) are still reported
+    unavailable. Tombstones are capped at max_tombstones (oldest dropped first),
+    survive rebuild(), and can be persisted via tombstoned_ids/restore_tombstones.
+    """
+
+    def __init__(self, context_vocabulary=(), max_tombstones=MAX_TOMBSTONES):
+        self.context_vocabulary = frozenset(context_vocabulary)
+        self.max_tombstones = max_tombstones
+        self.slots = {}
+        self.free_slots = []
+        self.tombstones = OrderedDict()
+        self.availability_bitmap = bytearray()
+        self.context_keywords = {}
+
+    def __len__(self):
+        return len(self.slots)
+
+    def __contains__(self, product_id):
+        return product_id in self.slots
+
+    def rebuild(self, product_features):
+        """Rebuild the index from scratch (used after loading models); tombstones are kept"""
+        tombstones = self.tombstones
+        self.__init__(self.context_vocabulary, self.max_tombstones)
+        self.restore_tombstones(tombstones)
+        for product_id, features in product_features.items():
+            self.upsert(product_id, features)
+
+    def upsert(self, product_id, features):
+        """Insert or refresh a product's derived data
+
+        A product that is already indexed keeps its current availability
+        unless features carries 'is_available', so partial refreshes (price,
+        rating) never put an out-of-stock product back on sale.
+        """
+        slot = self.slots.get(product_id)
+        if slot is None:
+            slot = self._allocate_slot()
+            self.slots[product_id] = slot
+            self.tombstones.pop(product_id, None)
+            self._set_bit(slot, features.get('is_available', True))
+        elif 'is_available' in features:
+            self._set_bit(slot, features['is_available'])
+
+        self.context_keywords[product_id] = self._extract_keywords(features.get('name', ''))
+
+    def delete(self, product_id):
+        """Free a product's slot and tombstone its ID as unavailable"""
+        slot = self.slots.pop(product_id, None)
+        if slot is None:
+            return False
+
+        self._set_bit(slot, False)
+        self.free_slots.append(slot)
+        self.context_keywords.pop(product_id, None)
+        self._add_tombstone(product_id)
+        return True
+
+    def set_available(self, product_id, available):
+        """Flip a product's availability bit"""
+        slot = self.slots.get(product_id)
+        if slot is None:
+            return False
+
+        self._set_bit(slot, available)
+        return True
+
+    def is_available(self, product_id):
+        """Constant-time availability lookup; never-seen products count as available"""
+        slot = self.slots.get(product_id)
+        if slot is None:
+            return product_id not in self.tombstones
+
+        return bool(self.availability_bitmap[slot >> 3] & (1 << (slot & 7)))
+
+    def get_context_keywords(self, product_id):
+        """Context vocabulary words in the product's name, or None if it is not indexed"""
+        return self.context_keywords.get(product_id)
+
+    @property
+    def tombstoned_ids(self):
+        """Deleted product IDs, oldest first"""
+        return list(self.tombstones)
+
+    def restore_tombstones(self, product_ids):
+        """Re-apply tombstones saved from an earlier process"""
+        for product_id in product_ids:
+            if product_id not in self.slots:
+                self._add_tombstone(product_id)
+
+    def _allocate_slot(self):
+        if self.free_slots:
+            return self.free_slots.pop()
+
+        slot = len(self.slots)
+        if slot >> 3 >= len(self.availability_bitmap):
+            self.availability_bitmap.append(0)
+        return slot
+
+    def _add_tombstone(self, product_id):
+        self.tombstones[product_id] = None
+        self.tombstones.move_to_end(product_id)
+        while len(self.tombstones) > self.max_tombstones:
+            self.tombstones.popitem(last=False)
+
+    def _extract_keywords(self, name):
+        name = (name or '').lower()
+        return frozenset(word for word in self.context_vocabulary if word in name)
+
+    def _set_bit(self, slot, value):
+        if value:
+            self.availability_bitmap[slot >> 3] |= 1 << (slot & 7)
+        else:
+            self.availability_bitmap[slot >> 3] &= ~(1 << (slot & 7)) & 0xFF
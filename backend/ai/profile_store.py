@@ -0,0 +1,661 @@
+#!/usr/bin/env python3
+"""
+Partitioned User Profile Store
+Consistent-hash sharding of user profiles across local shard processes
+"""
+
+import bisect
+import hashlib
+import heapq
+import os
+import pickle
+import sys
+import threading
+from contextlib import contextmanager
+from datetime import datetime
+
+# multiprocessing and argparse are imported where used: the engine only needs
+# the profile helpers below and should not pay for them at import time
+
+DEFAULT_AUTHKEY = b'food-app-profiles'
+VIRTUAL_NODES = 64
+SIMILARITY_THRESHOLD = 0.5
+
+
+def default_user_profile():
+    """Profile assigned to users seen for the first time"""
+    return {
+        'preferences': [],
+        'order_history': [],
+        'dietary_restrictions': [],
+        'price_sensitivity': 0.5,
+        'order_frequency': 1.0,
+        'avg_order_value': 20.0,
+        'last_updated': datetime.now().isoformat()
+    }
+
+
+def apply_profile_update(profile, interaction_data):
+    """Fold new interaction data into a profile in place"""
+    # Update order history
+    if 'ordered_items' in interaction_data:
+        profile['order_history'].extend(interaction_data['ordered_items'])
+        profile['order_history'] = profile['order_history'][-50:]  # Keep last 50
+
+    # Update preferences
+    if 'preferences' in interaction_data:
+        profile['preferences'].extend(interaction_data['preferences'])
+        profile['preferences'] = list(set(profile['preferences']))  # Remove duplicates
+
+    # Update order frequency
+    if 'order_value' in interaction_data:
+        current_avg = profile['avg_order_value']
+        order_value = interaction_data['order_value']
+        profile['avg_order_value'] = (current_avg + order_value) / 2
+
+    # Update dietary restrictions
+    if 'dietary_changes' in interaction_data:
+        profile['dietary_restrictions'] = list(set(
+            profile['dietary_restrictions'] + interaction_data['dietary_changes']
+        ))
+
+    profile['last_updated'] = datetime.now().isoformat()
+    return profile
+
+
+def calculate_user_similarity(profile1, profile2):
+    """Calculate similarity between two user profiles"""
+    score = 0.0
+
+    # Compare preferences
+    prefs1 = set(profile1.get('preferences', []))
+    prefs2 = set(profile2.get('preferences', []))
+    if prefs1 and prefs2:
+        common_prefs = prefs1.intersection(prefs2)
+        score += len(common_prefs) / max(len(prefs1), len(prefs2)) * 0.4
+
+    # Compare dietary restrictions
+    diet1 = set(profile1.get('dietary_restrictions', []))
+    diet2 = set(profile2.get('dietary_restrictions', []))
+    if diet1 and diet2:
+        common_diet = diet1.intersection(diet2)
+        score += len(common_diet) / max(len(diet1), len(diet2)) * 0.3
+
+    # Compare price sensitivity
+    price_sens1 = profile1.get('price_sensitivity', 0.5)
+    price_sens2 = profile2.get('price_sensitivity', 0.5)
+    price_diff = abs(price_sens1 - price_sens2)
+    score += (1.0 - price_diff) * 0.3
+
+    return min(score, 1.0)
+
+
+def similarity_rank(match):
+    """Sort key for (user_id, similarity): best first, ties broken by user_id"""
+    return (-match[1], match[0])
+
+
+def rank_similar_users(profiles, target_profile, exclude_user_id, limit,
+                       threshold=SIMILARITY_THRESHOLD, with_orders=False):
+    """Top (user_id, similarity) pairs above the threshold, best first
+
+    With with_orders, each match also carries the user's order_history so
+    callers need no extra lookup per neighbour.
+    """
+    candidates = []
+    for other_user_id, other_profile in profiles.items():
+        if other_user_id == exclude_user_id:
+            continue
+
+        similarity = calculate_user_similarity(target_profile, other_profile)
+        if similarity > threshold:
+            if with_orders:
+                candidates.append((other_user_id, similarity,
+                                   list(other_profile.get('order_history', []))))
+            else:
+                candidates.append((other_user_id, similarity))
+
+    return heapq.nsmallest(limit, candidates, key=similarity_rank)
+
+
+def authkey_from_env():
+    """Shard authkey from AI_PROFILE_SHARD_AUTHKEY, or the development default"""
+    authkey = os.environ.get('AI_PROFILE_SHARD_AUTHKEY')
+    return authkey.encode('utf-8') if authkey else DEFAULT_AUTHKEY
+
+
+def is_loopback(host):
+    """True when host only resolves to the local machine"""
+    import ipaddress
+
+    if host == 'localhost':
+        return True
+    try:
+        return ipaddress.ip_address(host).is_loopback
+    except ValueError:
+        return False
+
+
+def check_authkey(address, authkey):
+    """Refuse the public default authkey for anything but loopback addresses
+
+    Shards exchange pickles, so anyone holding the authkey can run code in a
+    shard; the default key is only safe when nobody else can reach the port.
+    """
+    host = parse_address(address)[0]
+    if authkey == DEFAULT_AUTHKEY and not is_loopback(host):
+        raise ValueError(
+            f"Set AI_PROFILE_SHARD_AUTHKEY to use profile shards on non-loopback host {host}"
+        )
+
+
+def parse_address(address):
+    """Turn 'host:port' into a (host, port) tuple"""
+    if isinstance(address, tuple):
+        return address
+    host, _, port = address.rpartition(':')
+    return (host or '127.0.0.1', int(port))
+
+
+class HashRing:
+    """Consistent-hash ring with virtual nodes"""
+
+    def __init__(self, nodes=(), virtual_nodes=VIRTUAL_NODES):
+        self.virtual_nodes = virtual_nodes
+        self.points = []
+        self.owners = {}
+        for node in nodes:
+            self.add(node)
+
+    @staticmethod
+    def hash_key(key):
+        return int.from_bytes(hashlib.md5(str(key).encode('utf-8')).digest()[:8], 'big')
+
+    def add(self, node):
+        for replica in range(self.virtual_nodes):
+            point = self.hash_key(f"{node}#{replica}")
+            bisect.insort(self.points, point)
+            self.owners[point] = node
+
+    def remove(self, node):
+        for replica in range(self.virtual_nodes):
+            point = self.hash_key(f"{node}#{replica}")
+            if self.owners.pop(point, None) is not None:
+                del self.points[bisect.bisect_left(self.points, point)]
+
+    def owner(self, key):
+        if not self.points:
+            raise LookupError("Hash ring has no shards")
+        index = bisect.bisect(self.points, self.hash_key(key)) % len(self.points)
+        return self.owners[self.points[index]]
+
+
+class ProfileShard:
+    """Profiles owned by a single shard process"""
+
+    def __init__(self, snapshot_path=None):
+        self.snapshot_path = snapshot_path
+        self.profiles = {}
+        self.lock = threading.Lock()
+        if snapshot_path and os.path.exists(snapshot_path):
+            with open(snapshot_path, 'rb') as f:
+                self.profiles = pickle.load(f)
+
+    def handle(self, op, args):
+        with self.lock:
+            if op == 'get':
+                return self.profiles.get(args[0])
+            if op == 'put':
+                self.profiles[args[0]] = args[1]
+                return None
+            if op == 'setdefault':
+                return self.profiles.setdefault(args[0], args[1])
+            if op == 'contains':
+                return args[0] in self.profiles
+            if op == 'update':
+                profile = self.profiles.setdefault(args[0], default_user_profile())
+                return apply_profile_update(profile, args[1])
+            if op == 'similar':
+                return rank_similar_users(self.profiles, *args)
+            if op == 'keys':
+                return list(self.profiles)
+            if op == 'count':
+                return len(self.profiles)
+            if op == 'put_many':
+                self.profiles.update(args[0])
+                return len(args[0])
+            if op == 'get_many':
+                return {user_id: self.profiles[user_id]
+                        for user_id in args[0] if user_id in self.profiles}
+            if op == 'delete_many':
+                for user_id in args[0]:
+                    self.profiles.pop(user_id, None)
+                return len(args[0])
+            if op == 'dump':
+                return dict(self.profiles)
+            if op == 'save':
+                return self.save()
+        raise ValueError(f"Unknown shard operation: {op}")
+
+    def save(self):
+        if not self.snapshot_path:
+            return False
+        directory = os.path.dirname(self.snapshot_path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        with open(self.snapshot_path, 'wb') as f:
+            pickle.dump(self.profiles, f)
+        return True
+
+
+def serve_shard(address, authkey=DEFAULT_AUTHKEY, snapshot_path=None, ready=None):
+    """Run a profile shard server until it receives a 'shutdown' request
+
+    If given, ``ready`` is a connection that receives the bound address once
+    the shard accepts clients (so port 0 can be used for an ephemeral port).
+    """
+    from multiprocessing import AuthenticationError
+    from multiprocessing.connection import Client, Listener
+
+    check_authkey(address, authkey)
+    shard = ProfileShard(snapshot_path)
+    listener = Listener(parse_address(address), authkey=authkey)
+    stopping = threading.Event()
+
+    def serve_connection(conn):
+        with conn:
+            while True:
+                try:
+                    op, args = conn.recv()
+                except (EOFError, OSError):
+                    return
+                if op == 'shutdown':
+                    stopping.set()
+                    conn.send(('ok', shard.handle('save', ())))
+                    # Unblock accept() so the main loop can exit
+                    try:
+                        Client(listener.address, authkey=authkey).close()
+                    except OSError:
+                        pass
+                    return
+                try:
+                    conn.send(('ok', shard.handle(op, args)))
+                except Exception as e:
+                    conn.send(('error', f"{type(e).__name__}: {e}"))
+
+    if ready is not None:
+        ready.send(listener.address)
+        ready.close()
+    with listener:
+        while not stopping.is_set():
+            try:
+                conn = listener.accept()
+            except (AuthenticationError, EOFError) as e:
+                print(f"⚠️  Rejected profile shard connection: {e}", file=sys.stderr)
+                continue
+            except OSError:
+                continue
+            threading.Thread(target=serve_connection, args=(conn,), daemon=True).start()
+
+
+class ShardError(RuntimeError):
+    """Raised when a shard rejects a request"""
+
+
+class ReadWriteLock:
+    """Many concurrent readers or a single writer"""
+
+    def __init__(self):
+        self.condition = threading.Condition()
+        self.readers = 0
+        self.writing = False
+
+    @contextmanager
+    def read(self):
+        with self.condition:
+            while self.writing:
+                self.condition.wait()
+            self.readers += 1
+        try:
+            yield
+        finally:
+            with self.condition:
+                self.readers -= 1
+                if not self.readers:
+                    self.condition.notify_all()
+
+    @contextmanager
+    def write(self):
+        with self.condition:
+            while self.writing or self.readers:
+                self.condition.wait()
+            self.writing = True
+        try:
+            yield
+        finally:
+            with self.condition:
+                self.writing = False
+                self.condition.notify_all()
+
+
+class ShardedProfileStore:
+    """Router that sends profile reads and writes to the owning shard
+
+    Safe to share between threads: routed calls hold the topology read lock
+    for their whole round trip, and add_shard/remove_shard take it exclusively,
+    so no request can reach a shard that is handing the key over.
+    """
+
+    def __init__(self, addresses, authkey=DEFAULT_AUTHKEY, virtual_nodes=VIRTUAL_NODES):
+        self.authkey = authkey
+        self.ring = HashRing(virtual_nodes=virtual_nodes)
+        self.connections = {}
+        self.locks = {}
+        self.topology_lock = ReadWriteLock()
+        for address in addresses:
+            self._connect(parse_address(address))
+
+    # Mapping-style access used by AIRecommendationEngine
+    def __contains__(self, user_id):
+        return self._route(user_id, 'contains', user_id)
+
+    def __getitem__(self, user_id):
+        profile = self.get(user_id)
+        if profile is None:
+            raise KeyError(user_id)
+        return profile
+
+    def __setitem__(self, user_id, profile):
+        self._route(user_id, 'put', user_id, profile)
+
+    def __len__(self):
+        return sum(self.shard_counts().values())
+
+    def get(self, user_id, default=None):
+        profile = self._route(user_id, 'get', user_id)
+        return default if profile is None else profile
+
+    def setdefault(self, user_id, profile):
+        return self._route(user_id, 'setdefault', user_id, profile)
+
+    def items(self):
+        merged = {}
+        for profiles in self._broadcast('dump').values():
+            merged.update(profiles)
+        return merged.items()
+
+    def update(self, profiles):
+        """Bulk-load profiles, grouped into one request per shard"""
+        by_shard = {}
+        with self.topology_lock.read():
+            for user_id, profile in dict(profiles).items():
+                by_shard.setdefault(self.ring.owner(user_id), {})[user_id] = profile
+            for address, batch in by_shard.items():
+                self._call(address, 'put_many', batch)
+
+    def update_profile(self, user_id, interaction_data):
+        """Apply an interaction update on the owning shard"""
+        return self._route(user_id, 'update', user_id, interaction_data)
+
+    def find_similar(self, target_profile, exclude_user_id, limit,
+                     threshold=SIMILARITY_THRESHOLD, with_orders=False):
+        """Scatter the similarity search to every shard and merge the top-k"""
+        results = self._broadcast('similar', target_profile, exclude_user_id, limit,
+                                  threshold, with_orders)
+        merged = [match for matches in results.values() for match in matches]
+        return heapq.nsmallest(limit, merged, key=similarity_rank)
+
+    def shard_counts(self):
+        """Number of profiles held by each shard"""
+        return self._broadcast('count')
+
+    def save(self):
+        return self._broadcast('save')
+
+    # Topology changes
+    def add_shard(self, address):
+        """Join a new shard and move the profiles it now owns onto it"""
+        address = parse_address(address)
+        with self.topology_lock.write():
+            self._connect(address)
+            try:
+                return self._rebalance()
+            except Exception:
+                # Take the new shard out of the ring and move back anything it received
+                self.ring.remove(address)
+                try:
+                    self._rebalance()
+                finally:
+                    self._disconnect(address)
+                raise
+
+    def remove_shard(self, address):
+        """Drain a shard's profiles to the remaining shards and detach it"""
+        address = parse_address(address)
+        with self.topology_lock.write():
+            if address not in self.connections:
+                raise ValueError(f"Unknown profile shard {address[0]}:{address[1]}")
+            if len(self.connections) == 1:
+                raise ValueError("Cannot remove the last profile shard")
+            self.ring.remove(address)
+            try:
+                moved = self._rebalance()
+            except Exception:
+                # Profiles are only deleted after a successful copy, so the
+                # shard still owns whatever was not moved
+                self.ring.add(address)
+                raise
+            self._disconnect(address)
+            return moved
+
+    def close(self):
+        for conn in self.connections.values():
+            conn.close()
+        self.connections.clear()
+
+    def _rebalance(self):
+        moved = 0
+        for address in list(self.connections):
+            outgoing = {}
+            for user_id in self._call(address, 'keys'):
+                owner = self.ring.owner(user_id)
+                if owner != address:
+                    outgoing.setdefault(owner, []).append(user_id)
+            for owner, user_ids in outgoing.items():
+                # Copy, then delete only once the new owner has the profiles
+                profiles = self._call(address, 'get_many', user_ids)
+                self._call(owner, 'put_many', profiles)
+                self._call(address, 'delete_many', list(profiles))
+                moved += len(profiles)
+        return moved
+
+    def _connect(self, address):
+        from multiprocessing.connection import Client
+
+        check_authkey(address, self.authkey)
+        self.connections[address] = Client(address, authkey=self.authkey)
+        self.locks[address] = threading.Lock()
+        self.ring.add(address)
+
+    def _disconnect(self, address):
+        self.connections.pop(address).close()
+        self.locks.pop(address)
+
+    def _route(self, user_id, op, *args):
+        with self.topology_lock.read():
+            return self._call(self.ring.owner(user_id), op, *args)
+
+    def _call(self, address, op, *args):
+        with self.locks[address]:
+            conn = self.connections[address]
+            conn.send((op, args))
+            return self._unwrap(address, conn.recv())
+
+    def _broadcast(self, op, *args):
+        # Send to every shard before waiting on any, so shards work in parallel
+        with self.topology_lock.read():
+            addresses = list(self.connections)
+            for address in addresses:
+                self.locks[address].acquire()
+            try:
+                for address in addresses:
+                    self.connections[address].send((op, args))
+                # Drain every reply before raising, or the unread ones would be
+                # returned to the next call on those connections
+                replies = {address: self.connections[address].recv() for address in addresses}
+                return {address: self._unwrap(address, reply) for address, reply in replies.items()}
+            finally:
+                for address in addresses:
+                    self.locks[address].release()
+
+    @staticmethod
+    def _unwrap(address, reply):
+        status, value = reply
+        if status != 'ok':
+            raise ShardError(f"Shard {address[0]}:{address[1]} failed: {value}")
+        return value
+
+
+class LocalShardCluster:
+    """Spawn profile shards as local processes (development and testing)
+
+    With base_port=0 every shard binds an ephemeral port.
+    """
+
+    def __init__(self, shard_count, base_port=7101, authkey=DEFAULT_AUTHKEY,
+                 host='127.0.0.1', snapshot_dir=None):
+        self.authkey = authkey
+        self.host = host
+        self.snapshot_dir = snapshot_dir
+        self.next_port = base_port
+        self.spawned = 0
+        self.processes = {}
+        for _ in range(shard_count):
+            self.spawn()
+
+    @property
+    def addresses(self):
+        return list(self.processes)
+
+    def spawn(self):
+        """Start one more shard process and return its address"""
+        import multiprocessing
+
+        requested = (self.host, self.next_port)
+        if self.next_port:
+            self.next_port += 1
+        snapshot_path = None
+        if self.snapshot_dir:
+            snapshot_path = os.path.join(self.snapshot_dir, f"profiles_{self.spawned}.pkl")
+        self.spawned += 1
+
+        ready_reader, ready_writer = multiprocessing.Pipe(duplex=False)
+        process = multiprocessing.Process(
+            target=serve_shard,
+            args=(requested, self.authkey, snapshot_path, ready_writer),
+            daemon=True
+        )
+        process.start()
+        # Close our copy so a child that dies before binding shows up as EOF
+        ready_writer.close()
+        address = None
+        try:
+            if ready_reader.poll(10):
+                address = ready_reader.recv()
+        except EOFError:
+            pass
+        finally:
+            ready_reader.close()
+        if address is None:
+            process.terminate()
+            process.join(timeout=5)
+            raise RuntimeError(f"Profile shard on {requested[0]}:{requested[1]} failed to start")
+
+        self.processes[address] = process
+        return address
+
+    def stop(self, address):
+        from multiprocessing.connection import Client
+
+        process = self.processes.pop(address)
+        try:
+            with Client(address, authkey=self.authkey) as conn:
+                conn.send(('shutdown', ()))
+                conn.recv()
+        except (OSError, EOFError):
+            pass
+        process.join(timeout=5)
+        if process.is_alive():
+            process.terminate()
+
+    def shutdown(self):
+        for address in list(self.processes):
+            self.stop(address)
+
+
+def run_demo(shard_count, base_port, users, authkey=DEFAULT_AUTHKEY):
+    """Exercise routing, scatter-gather and rebalancing on local processes"""
+    cluster = LocalShardCluster(shard_count, base_port, authkey)
+    store = ShardedProfileStore(cluster.addresses, authkey)
+    try:
+        cuisines = ['italian', 'spicy', 'vegetarian', 'thai', 'indian', 'mexican']
+        for i in range(users):
+            profile = default_user_profile()
+            profile['preferences'] = [cuisines[i % len(cuisines)], cuisines[(i * 7) % len(cuisines)]]
+            profile['price_sensitivity'] = (i % 10) / 10
+            store[f'user_{i}'] = profile
+        store.update_profile('user_0', {'ordered_items': ['pizza'], 'order_value': 30.0})
+
+        counts = store.shard_counts()
+        print(f"✅ {len(store)} profiles across {len(counts)} shards: "
+              f"{sorted(counts.values())}")
+
+        similar = store.find_similar(store['user_0'], 'user_0', 5)
+        print(f"🔎 Top matches for user_0: {similar}")
+
+        moved = store.add_shard(cluster.spawn())
+        counts = store.shard_counts()
+        print(f"➕ Added a shard, moved {moved} profiles: {sorted(counts.values())}")
+
+        assert len(store) == users
+        assert store['user_0']['order_history'] == ['pizza']
+        assert store.find_similar(store['user_0'], 'user_0', 5) == similar
+        print("✅ Sharded profile store checks passed")
+    finally:
+        store.close()
+        cluster.shutdown()
+
+
+def main():
+    """Main function for CLI usage"""
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Partitioned user profile store")
+    subparsers = parser.add_subparsers(dest='command', required=True)
+
+    serve = subparsers.add_parser('serve', help="run a single profile shard")
+    serve.add_argument('address', help="host:port to listen on")
+    serve.add_argument('--snapshot', help="pickle file the shard loads and saves")
+
+    demo = subparsers.add_parser('demo', help="run a local multi-process cluster")
+    demo.add_argument('--shards', type=int, default=3)
+    demo.add_argument('--base-port', type=int, default=7101)
+    demo.add_argument('--users', type=int, default=1000)
+
+    args = parser.parse_args()
+    authkey = authkey_from_env()
+
+    if args.command == 'serve':
+        try:
+            check_authkey(args.address, authkey)
+        except ValueError as e:
+            print(f"❌ {e}")
+            sys.exit(1)
+        print(f"🗄️  Profile shard listening on {args.address}")
+        serve_shard(args.address, authkey, args.snapshot)
+    elif args.command == 'demo':
+        run_demo(args.shards, args.base_port, args.users, authkey)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,190 @@
+#!/usr/bin/env python3
+"""
+AI Engine Startup Benchmark
+Measures cold-start import time and time-to-first-recommendation against a budget
+"""
+
+import argparse
+import json
+import os
+import pickle
+import random
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+ENGINE_DIR = os.path.dirname(os.path.abspath(__file__))
+DEFAULT_BUDGET_PATH = os.path.join(ENGINE_DIR, 'startup_budget.json')
+
+SAMPLE_CONTEXT = {
+    'time_of_day': 'dinner',
+    'weather': 'cold',
+    'mood': 'happy',
+    'location': {'popular_cuisines': ['italian', 'thai']}
+}
+
+# Runs in a fresh interpreter so every sample is a true cold start
+CHILD_SCRIPT = r'''
+import contextlib, io, json, sys, time
+sys.path.insert(0, sys.argv[1])
+user_id, context, lazy_modules = sys.argv[2], json.loads(sys.argv[3]), json.loads(sys.argv[4])
+
+start = time.perf_counter()
+import ai_recommendation_engine
+imported = time.perf_counter()
+loaded_at_import = sorted(m for m in lazy_modules if m in sys.modules)
+
+engine_output = io.StringIO()
+with contextlib.redirect_stdout(engine_output):
+    engine = ai_recommendation_engine.AIRecommendationEngine()
+    result = engine.get_personalized_recommendations(user_id, 10, context)
+done = time.perf_counter()
+
+print(json.dumps({
+    'import_ms': (imported - start) * 1000,
+    'first_recommendation_ms': (done - start) * 1000,
+    'loaded_at_import': loaded_at_import,
+    'loaded_by_first_recommendation': sorted(m for m in lazy_modules if m in sys.modules),
+    'method': result['metadata']['method'],
+    'recommendations': len(result['recommendations']),
+    'engine_output': engine_output.getvalue()
+}))
+'''
+
+
+def load_budget(path):
+    """Load the startup budget configuration"""
+    with open(path) as f:
+        return json.load(f)
+
+
+def write_sample_models(directory, product_count, user_count, seed=7):
+    """Write a representative models/ directory for the engine to load"""
+    rng = random.Random(seed)
+    cuisines = ['italian', 'thai', 'indian', 'mexican', 'japanese', 'american']
+    dishes = ['pizza', 'pasta', 'salad', 'soup', 'wrap', 'sandwich', 'dessert', 'coffee']
+    styles = ['hot', 'fresh', 'comfort', 'spicy', 'light', 'hearty', 'premium', 'colorful']
+
+    product_features = {}
+    for i in range(product_count):
+        product_features[f'product_{i}'] = {
+            'name': f"{rng.choice(styles).title()} {rng.choice(dishes)} {i}",
+            'cuisine': rng.choice(cuisines),
+            'spice_level': rng.randint(0, 4),
+            'is_vegetarian': rng.random() < 0.4,
+            'price': round(rng.uniform(8, 35), 2),
+            'rating': round(rng.uniform(3.0, 5.0), 1),
+            'tags': rng.sample(dishes + styles, 3)
+        }
+
+    product_ids = list(product_features)
+    user_profiles = {}
+    for i in range(user_count):
+        user_profiles[f'user_{i}'] = {
+            'preferences': rng.sample(cuisines + ['spicy', 'vegetarian'], 3),
+            'order_history': rng.sample(product_ids, min(10, len(product_ids))),
+            'dietary_restrictions': [],
+            'price_sensitivity': round(rng.uniform(0.3, 0.9), 2),
+            'order_frequency': round(rng.uniform(0.5, 5.0), 1),
+            'avg_order_value': round(rng.uniform(15, 30), 2)
+        }
+
+    models_dir = os.path.join(directory, 'models')
+    os.makedirs(models_dir, exist_ok=True)
+    with open(os.path.join(models_dir, 'product_features.pkl'), 'wb') as f:
+        pickle.dump(product_features, f)
+    with open(os.path.join(models_dir, 'user_profiles.pkl'), 'wb') as f:
+        pickle.dump(user_profiles, f)
+
+
+def run_sample(user_id, context, lazy_modules, models_dir):
+    """Measure one cold start in a new interpreter"""
+    started = time.perf_counter()
+    result = subprocess.run(
+        [sys.executable, '-c', CHILD_SCRIPT, ENGINE_DIR, user_id,
+         json.dumps(context), json.dumps(lazy_modules)],
+        cwd=models_dir,
+        capture_output=True,
+        text=True,
+        check=True
+    )
+    sample = json.loads(result.stdout.strip().splitlines()[-1])
+    sample['process_ms'] = (time.perf_counter() - started) * 1000
+    return sample
+
+
+def run_benchmark(budget, runs=5, user_id='user_0', models_dir=None):
+    """Collect cold-start samples and compare their medians with the budget"""
+    lazy_modules = budget.get('lazy_modules', [])
+    context = budget.get('context', SAMPLE_CONTEXT)
+
+    if models_dir is None:
+        with tempfile.TemporaryDirectory() as scratch_dir:
+            write_sample_models(scratch_dir, budget.get('sample_products', 500),
+                                budget.get('sample_users', 1000))
+            samples = [run_sample(user_id, context, lazy_modules, scratch_dir) for _ in range(runs)]
+    else:
+        samples = [run_sample(user_id, context, lazy_modules, models_dir) for _ in range(runs)]
+
+    report = {
+        metric: statistics.median(sample[metric] for sample in samples)
+        for metric in ('import_ms', 'first_recommendation_ms', 'process_ms')
+    }
+    report['loaded_at_import'] = sorted({m for sample in samples for m in sample['loaded_at_import']})
+    report['loaded_by_first_recommendation'] = sorted(
+        {m for sample in samples for m in sample['loaded_by_first_recommendation']}
+    )
+
+    failures = []
+    for metric in ('import_ms', 'first_recommendation_ms'):
+        if metric in budget and report[metric] > budget[metric]:
+            failures.append(f"{metric} {report[metric]:.1f} exceeds budget {budget[metric]:.1f}")
+    if report['loaded_at_import']:
+        failures.append(f"eagerly imported: {', '.join(report['loaded_at_import'])}")
+
+    # A fallback answer means the timed path skipped the real scoring work
+    for sample in samples:
+        if sample['method'] == 'fallback' or not sample['recommendations']:
+            failure = (f"first recommendation was not a real result "
+                       f"(method={sample['method']}, {sample['recommendations']} recommendations)")
+            output = sample['engine_output'].strip().splitlines()
+            if sample['method'] == 'fallback' and output:
+                failure += f": {output[-1]}"
+            failures.append(failure)
+            break
+
+    return report, failures
+
+
+def main():
+    """Main function for CLI usage"""
+    parser = argparse.ArgumentParser(description="Cold-start benchmark for the AI recommendation engine")
+    parser.add_argument('--budget', default=DEFAULT_BUDGET_PATH, help="budget JSON file")
+    parser.add_argument('--runs', type=int, default=5, help="cold starts to sample")
+    parser.add_argument('--user-id', default='user_0')
+    parser.add_argument('--models-dir', help="directory containing models/ (default: generated sample models)")
+    args = parser.parse_args()
+
+    budget = load_budget(args.budget)
+    report, failures = run_benchmark(budget, args.runs, args.user_id, args.models_dir)
+
+    print(f"⏱️  Engine cold start (median of {args.runs} runs)")
+    print(f"   import:               {report['import_ms']:8.1f} ms (budget {budget.get('import_ms', '-')})")
+    print(f"   first recommendation: {report['first_recommendation_ms']:8.1f} ms "
+          f"(budget {budget.get('first_recommendation_ms', '-')})")
+    print(f"   process wall time:    {report['process_ms']:8.1f} ms")
+    if report['loaded_by_first_recommendation']:
+        print(f"   loaded on first use:  {', '.join(report['loaded_by_first_recommendation'])}")
+
+    if failures:
+        for failure in failures:
+            print(f"❌ {failure}")
+        sys.exit(1)
+
+    print("✅ Startup within budget")
+
+
+if __name__ == "__main__":
+    main()
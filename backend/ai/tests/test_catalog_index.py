@@ -0,0 +1,136 @@
+"""
+Tests for the product catalog index and the engine's catalog mutation API
+"""
+
+import contextlib
+import io
+import os
+import sys
+import tempfile
+import unittest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from catalog_index import ProductCatalogIndex
+from ai_recommendation_engine import AIRecommendationEngine, CONTEXT_VOCABULARY
+
+
+class ProductCatalogIndexTest(unittest.TestCase):
+    def setUp(self):
+        self.catalog = ProductCatalogIndex(CONTEXT_VOCABULARY)
+        for i in range(20):
+            self.catalog.upsert(f'p{i}', {'name': f'Dish {i}'})
+
+    def test_bitmap_spans_byte_boundaries(self):
+        self.assertEqual(len(self.catalog.availability_bitmap), 3)
+        for i in (7, 8, 9, 16):
+            self.catalog.set_available(f'p{i}', False)
+
+        unavailable = [i for i in range(20) if not self.catalog.is_available(f'p{i}')]
+        self.assertEqual(unavailable, [7, 8, 9, 16])
+
+    def test_toggle_availability(self):
+        self.assertTrue(self.catalog.set_available('p3', False))
+        self.assertFalse(self.catalog.is_available('p3'))
+        self.assertTrue(self.catalog.set_available('p3', True))
+        self.assertTrue(self.catalog.is_available('p3'))
+        self.assertFalse(self.catalog.set_available('missing', False))
+
+    def test_refresh_without_availability_keeps_stock_state(self):
+        self.catalog.set_available('p4', False)
+        self.catalog.upsert('p4', {'name': 'Dish 4', 'price': 12.0})
+        self.assertFalse(self.catalog.is_available('p4'))
+
+        self.catalog.upsert('p4', {'name': 'Dish 4', 'is_available': True})
+        self.assertTrue(self.catalog.is_available('p4'))
+
+    def test_delete_then_readd(self):
+        self.assertTrue(self.catalog.delete('p5'))
+        self.assertNotIn('p5', self.catalog)
+        self.assertFalse(self.catalog.is_available('p5'))
+        self.assertFalse(self.catalog.delete('p5'))
+        self.assertTrue(self.catalog.is_available('never_seen'))
+
+        # The freed slot is reused, and re-adding the ID clears its tombstone
+        self.catalog.upsert('p_new', {'name': 'New dish'})
+        self.assertEqual(len(self.catalog.slots), 20)
+        self.catalog.upsert('p5', {'name': 'Dish 5'})
+        self.assertTrue(self.catalog.is_available('p5'))
+        self.assertNotIn('p5', self.catalog.tombstoned_ids)
+
+    def test_tombstones_are_capped_and_survive_rebuild(self):
+        catalog = ProductCatalogIndex(max_tombstones=3)
+        for i in range(5):
+            catalog.upsert(f'd{i}', {})
+            catalog.delete(f'd{i}')
+        self.assertEqual(catalog.tombstoned_ids, ['d2', 'd3', 'd4'])
+
+        catalog.rebuild({'d3': {}})
+        self.assertTrue(catalog.is_available('d3'))
+        self.assertFalse(catalog.is_available('d4'))
+
+    def test_context_keywords_follow_name_changes(self):
+        self.catalog.upsert('p1', {'name': 'Hot soup'})
+        self.assertEqual(self.catalog.get_context_keywords('p1'), {'hot', 'soup'})
+
+        self.catalog.upsert('p1', {'name': 'Fresh salad'})
+        self.assertEqual(self.catalog.get_context_keywords('p1'), {'fresh', 'salad'})
+        self.assertIsNone(self.catalog.get_context_keywords('not_indexed'))
+
+
+class EngineCatalogMutationTest(unittest.TestCase):
+    def setUp(self):
+        # Run in an empty directory so no saved models are picked up
+        self.cwd = os.getcwd()
+        self.scratch = tempfile.TemporaryDirectory()
+        os.chdir(self.scratch.name)
+        with contextlib.redirect_stdout(io.StringIO()):
+            self.engine = AIRecommendationEngine()
+        self.engine.upsert_product('p1', {'name': 'Pizza', 'price': 20.0})
+        self.engine.upsert_product('p2', {'name': 'Soup', 'price': 20.0})
+
+        # Wide price tolerance so only the availability rule can reject
+        self.profile = {'preferences': [], 'order_history': [], 'dietary_restrictions': [],
+                        'price_sensitivity': 2.0, 'avg_order_value': 20.0}
+
+    def tearDown(self):
+        os.chdir(self.cwd)
+        self.scratch.cleanup()
+
+    def recommended(self, product_ids):
+        recs = [{'product_id': product_id, 'total_score': 1.0} for product_id in product_ids]
+        return [rec['product_id'] for rec in self.engine.apply_business_rules(recs, self.profile)]
+
+    def test_deleted_product_is_rejected_by_business_rules(self):
+        self.assertEqual(self.recommended(['p2', 'from_order_history']), ['p2', 'from_order_history'])
+
+        self.assertTrue(self.engine.delete_product('p2'))
+        self.assertFalse(self.engine.is_available('p2'))
+        self.assertEqual(self.recommended(['p2', 'from_order_history']), ['from_order_history'])
+
+    def test_availability_and_price_updates(self):
+        self.assertTrue(self.engine.set_product_availability('p1', False))
+        self.assertEqual(self.recommended(['p1']), [])
+
+        self.assertTrue(self.engine.update_product_price('p1', 18.0))
+        self.engine.upsert_product('p1', {'name': 'Pizza', 'price': 19.0, 'rating': 4.8})
+        self.assertFalse(self.engine.is_available('p1'))
+        self.assertFalse(self.engine.update_product_price('missing', 1.0))
+
+    def test_unindexed_product_still_gets_context_score(self):
+        self.engine.product_features['p3'] = {'name': 'Cold salad', 'price': 20.0}
+        recs = self.engine.contextual_filtering(self.profile, {'weather': 'hot'}, 10)
+        scores = {rec['product_id']: rec['score'] for rec in recs}
+        self.assertAlmostEqual(scores['p3'], 0.8 * 0.25)
+
+    def test_tombstones_persist_across_save_and_load(self):
+        self.engine.delete_product('p2')
+        with contextlib.redirect_stdout(io.StringIO()):
+            self.engine.save_models()
+            reloaded = AIRecommendationEngine()
+        self.assertFalse(reloaded.is_available('p2'))
+        self.assertTrue(reloaded.is_available('p1'))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,181 @@
+"""
+Tests for the partitioned user profile store, run against local shard processes
+"""
+
+import contextlib
+import io
+import os
+import sys
+import tempfile
+import time
+import unittest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from profile_store import (
+    LocalShardCluster,
+    ShardError,
+    ShardedProfileStore,
+    check_authkey,
+    default_user_profile,
+    rank_similar_users
+)
+
+CUISINES = ['italian', 'spicy', 'vegetarian', 'thai', 'indian', 'mexican']
+
+
+def sample_profiles(count):
+    profiles = {}
+    for i in range(count):
+        profile = default_user_profile()
+        profile['preferences'] = [CUISINES[i % len(CUISINES)], CUISINES[(i * 7) % len(CUISINES)]]
+        profile['price_sensitivity'] = (i % 10) / 10
+        profiles[f'user_{i}'] = profile
+    return profiles
+
+
+class ShardedProfileStoreTest(unittest.TestCase):
+    def setUp(self):
+        self.cluster = LocalShardCluster(3, base_port=0)
+        self.store = ShardedProfileStore(self.cluster.addresses)
+        self.profiles = sample_profiles(300)
+        self.store.update(self.profiles)
+
+    def tearDown(self):
+        self.store.close()
+        self.cluster.shutdown()
+
+    def test_routes_reads_and_writes_to_owning_shard(self):
+        self.assertEqual(len(self.store), len(self.profiles))
+        self.assertTrue(all(count > 0 for count in self.store.shard_counts().values()))
+
+        self.store.update_profile('user_7', {'ordered_items': ['pizza'], 'order_value': 30.0})
+        self.assertEqual(self.store['user_7']['order_history'], ['pizza'])
+        self.assertEqual(self.store['user_7']['avg_order_value'], 25.0)
+
+        created = self.store.setdefault('new_user', default_user_profile())
+        self.assertIn('new_user', self.store)
+        self.assertEqual(self.store.setdefault('new_user', {'preferences': ['x']}), created)
+        self.assertNotIn('missing_user', self.store)
+        self.assertRaises(KeyError, lambda: self.store['missing_user'])
+
+    def test_scatter_gather_matches_single_process_ranking(self):
+        for user_id in ('user_0', 'user_5', 'user_42'):
+            target = self.profiles[user_id]
+            expected = rank_similar_users(self.profiles, target, user_id, 10)
+            self.assertEqual(self.store.find_similar(target, user_id, 10), expected)
+
+    def test_add_and_remove_shard_rebalances(self):
+        target = self.profiles['user_0']
+        before = self.store.find_similar(target, 'user_0', 10)
+
+        new_address = self.cluster.spawn()
+        moved = self.store.add_shard(new_address)
+        counts = self.store.shard_counts()
+        self.assertEqual(counts[new_address], moved)
+        self.assertTrue(0 < moved < len(self.profiles))
+        self.assertEqual(len(self.store), len(self.profiles))
+
+        removed_address = self.cluster.addresses[0]
+        held = counts[removed_address]
+        self.assertEqual(self.store.remove_shard(removed_address), held)
+        self.assertNotIn(removed_address, self.store.shard_counts())
+        self.assertEqual(len(self.store), len(self.profiles))
+        self.assertEqual(self.store.find_similar(target, 'user_0', 10), before)
+
+    def test_failed_rebalance_keeps_profiles_on_source(self):
+        original = list(self.cluster.addresses)
+        call = self.store._call
+
+        def failing_call(address, op, *args):
+            if op == 'put_many':
+                raise ShardError("new owner unavailable")
+            return call(address, op, *args)
+
+        self.store._call = failing_call
+        with self.assertRaises(ShardError):
+            self.store.add_shard(self.cluster.spawn())
+        del self.store._call
+
+        self.assertEqual(set(self.store.shard_counts()), set(original))
+        self.assertEqual(len(self.store), len(self.profiles))
+        self.assertTrue(all(self.store[user_id] == profile
+                            for user_id, profile in self.profiles.items()))
+
+    def test_cannot_remove_last_or_unknown_shard(self):
+        with self.assertRaises(ValueError):
+            self.store.remove_shard(('127.0.0.1', 1))
+
+        for address in self.cluster.addresses[1:]:
+            self.store.remove_shard(address)
+        with self.assertRaises(ValueError):
+            self.store.remove_shard(self.cluster.addresses[0])
+
+        self.assertEqual(len(self.store), len(self.profiles))
+        self.assertEqual(self.store['user_3'], self.profiles['user_3'])
+
+    def test_engine_does_not_seed_sample_profiles_into_store(self):
+        from ai_recommendation_engine import AIRecommendationEngine
+
+        self.store['user_123'] = self.profiles['user_1']
+        cwd = os.getcwd()
+        with tempfile.TemporaryDirectory() as scratch:
+            os.chdir(scratch)
+            try:
+                # A corrupt product pickle sends load_models down the defaults path
+                os.makedirs('models')
+                with open(os.path.join('models', 'product_features.pkl'), 'wb') as f:
+                    f.write(b'not a pickle')
+                with contextlib.redirect_stdout(io.StringIO()):
+                    engine = AIRecommendationEngine(self.store)
+            finally:
+                os.chdir(cwd)
+
+        self.assertIn('product_1', engine.product_features)
+        self.assertEqual(self.store['user_123'], self.profiles['user_1'])
+
+    def test_shard_error_does_not_desynchronise_other_connections(self):
+        # A malformed profile makes one shard fail the similarity scan
+        self.store['broken_user'] = {'preferences': 5}
+        with self.assertRaises(ShardError):
+            self.store.find_similar(self.profiles['user_0'], 'user_0', 5)
+
+        counts = self.store.shard_counts()
+        self.assertTrue(all(isinstance(count, int) for count in counts.values()))
+        self.assertEqual(sum(counts.values()), len(self.profiles) + 1)
+        self.assertEqual(self.store['user_3'], self.profiles['user_3'])
+
+    def test_shard_survives_client_with_wrong_authkey(self):
+        from multiprocessing import AuthenticationError
+        from multiprocessing.connection import Client
+
+        address = self.cluster.addresses[0]
+        with self.assertRaises(AuthenticationError):
+            Client(address, authkey=b'wrong')
+        time.sleep(0.1)
+
+        self.assertTrue(self.cluster.processes[address].is_alive())
+        self.assertEqual(len(self.store), len(self.profiles))
+
+
+class ShardSetupTest(unittest.TestCase):
+    def test_default_authkey_is_refused_off_loopback(self):
+        check_authkey('127.0.0.1:7101', b'food-app-profiles')
+        check_authkey('localhost:7101', b'food-app-profiles')
+        check_authkey('0.0.0.0:7101', b'a-real-secret')
+        with self.assertRaises(ValueError):
+            check_authkey('0.0.0.0:7101', b'food-app-profiles')
+
+    def test_spawn_reports_shard_that_cannot_bind(self):
+        cluster = LocalShardCluster(1, base_port=0)
+        try:
+            taken_port = cluster.addresses[0][1]
+            cluster.next_port = taken_port
+            with self.assertRaises(RuntimeError):
+                cluster.spawn()
+        finally:
+            cluster.shutdown()
+
+
+if __name__ == "__main__":
+    unittest.main()